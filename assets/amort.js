@@ -0,0 +1,92 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    amort: {
+        /*
+         * Collect the mortgage inputs into the mtg-params store along with
+         * the names of the inputs that changed. Nothing is returned when the
+         * values are unchanged or invalid (an empty or out of range field is
+         * null, or the deposit covers the price), so the server callback
+         * isn't fired.
+         */
+        params: function(price, deposit, payment, ir, apr, fee, freq, prev) {
+            var params = {price: price, deposit: deposit, payment: payment,
+                          ir: ir, apr: apr, fee: fee, freq: freq};
+            var invalid = Object.keys(params).some(function(key) {
+                return params[key] === null || params[key] === undefined;
+            });
+            if (invalid || deposit >= price) {
+                return window.dash_clientside.no_update;
+            }
+            var old = prev ? prev.params : {};
+            var changed = Object.keys(params).filter(function(key) {
+                return params[key] !== old[key];
+            });
+            if (prev && changed.length === 0) {
+                return window.dash_clientside.no_update;
+            }
+            return {params: params, changed: changed};
+        },
+
+        /*
+         * Maintain the prepay-store: append the prepayment on Add Payment
+         * (when both the amount and date are filled in), clear it on Reset
+         * and when the tab is first loaded.
+         */
+        prepay: function(nAdd, nReset, value, date, store) {
+            var triggered = window.dash_clientside.callback_context.triggered;
+            var changed = triggered.length ? triggered[0].prop_id : '';
+            if (changed !== 'add-prepay.n_clicks' || !nAdd) {
+                return null;
+            }
+            if (value === null || value === undefined || !date) {
+                return window.dash_clientside.no_update;
+            }
+            return (store || []).concat([{date: date, value: value}]);
+        },
+
+        /*
+         * Render the amortization figure from the amort-figure store for the
+         * current real estate fee. The store holds the figure and the fee it
+         * was built with. Equity (customdata[1] of the mortgage trace) is
+         * value * (1 - fee) - mortgage, so the value is recovered from the
+         * stored equity and re-priced with the new fee. On the pay-off day
+         * the plotted mortgage is 0 rather than the overpaid balance, so that
+         * point is approximate until the server rebuilds the figure.
+         *
+         * When only the appreciation rate changed the store holds just the
+         * new equity (at the stored fee), which replaces the equity of the
+         * current figure.
+         */
+        restyle: function(data, fee, current) {
+            if (!data || fee === null || fee === undefined) {
+                return window.dash_clientside.no_update;
+            }
+            var fig = data.figure;
+            var equity = data.equity;
+            if (equity) {
+                if (!current) {
+                    return window.dash_clientside.no_update;
+                }
+                fig = current;
+            }
+            var oldFee = data.re_fee / 100;
+            var newFee = fee / 100;
+            if (!equity && oldFee === newFee) {
+                return fig;
+            }
+
+            var trace = fig.data[0];
+            var customdata = trace.customdata.map(function(row, i) {
+                var mortgage = trace.y[i];
+                var eq = equity ? equity[i] : row[1];
+                var value = (eq + mortgage) / (1 - oldFee);
+                var out = row.slice();
+                out[1] = value * (1 - newFee) - mortgage;
+                return out;
+            });
+
+            var traces = fig.data.slice();
+            traces[0] = Object.assign({}, trace, {customdata: customdata});
+            return Object.assign({}, fig, {data: traces});
+        }
+    }
+});
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Compile the amortization and investment kernels ahead of time so the web
+app doesn't pay the numba compile/cache-load cost on the first request.
+
+Run once on the deployment machine (requires numba):
+
+    python build_aot.py
+
+This writes the loan_calc_aot extension next to loan_calc.py, which
+get_amortization and get_rent_vs_own use when it can be imported.
+"""
+
+import os
+from numba.pycc import CC
+
+from loan_calc import _amortize, _invest
+
+cc = CC('loan_calc_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# (mortgage, price, ir, app, fees, payment, is_pay, prepay_idx, prepay_amt)
+# -> (start, payment, interest, end, value, equity, prepayment, last)
+cc.export('amortize',
+          'Tuple((f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], i8))'
+          '(f8, f8, f8, f8, f8, f8, b1[:], i8[:], f8[:])')(_amortize.py_func)
+
+# (deposit, inv, contrib, is_pay, equity) -> (start, end, cross_over)
+cc.export('invest',
+          'Tuple((f8[:], f8[:], i8[:]))'
+          '(f8, f8, f8, b1[:], f8[:])')(_invest.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
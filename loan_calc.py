@@ -5,12 +5,33 @@ Created on Mon Dec 28 11:29:28 2020
 @author: Ken Constable
 """
 
+import numpy as np
 import pandas as pd
 from datetime import timedelta, date
-from dateutil.relativedelta import relativedelta
+from functools import lru_cache
 import plotly.graph_objects as go
 import plotly.io as pio
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # numba is optional, the kernels below run as plain python without it
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    # precompiled _amortize and _invest, see build_aot.py
+    from loan_calc_aot import amortize as _amortize_aot
+    from loan_calc_aot import invest as _invest_aot
+except ImportError:
+    _amortize_aot = None
+    _invest_aot = None
+
 pio.renderers.default = 'browser'
 
 # Mortgage Constants
@@ -33,11 +54,17 @@ MONTHLY_FEES = 650
 ANNUAL_TAX = 5500
 MONTHLY_RENT = 2500
 
+# number of periods per year for each frequency, used by get_georeturn
+PERIODS_PER_YEAR = {'m': 12, 'b': 24, 'd': 365}
+
 
+@lru_cache(maxsize=32)
 def get_periods(start_date, yrs=25, frequency='b'):
     """
     Determine a range of dates from start_date to the number of years based
-    on the frequency. Used to determine when mortgage payments will occur
+    on the frequency. Used to determine when mortgage payments will occur.
+    Cached, the same start date/term is requested on every callback. The
+    returned index is shared between calls (DatetimeIndex is immutable)
 
     Parameters
     ----------
@@ -46,11 +73,17 @@ def get_periods(start_date, yrs=25, frequency='b'):
     yrs : int, optional
         Number of years to project. The default is 25.
     frequency : string, optional
-        The freqency of dates: m=monthly, b=bi-monthly, a=every two weeks
+        The freqency of dates: d=daily, m=monthly, b=bi-monthly, a=every two
+        weeks
 
     Returns
     -------
-    A list of payment dates
+    A DatetimeIndex of payment dates
+
+    Raises
+    ------
+    ValueError
+        If the frequency isn't recognized
 
     """
 
@@ -69,19 +102,257 @@ def get_periods(start_date, yrs=25, frequency='b'):
         rng = pd.date_range(start_date, end=end_date, freq='SM')
     elif frequency == 'a':
         # accelerated bi-weekly, every-14-days (26 pay-periods)
-        rng = []
-        dt = start_date
-        while dt + timedelta(days=14) <= end_date:
-            dt = dt + timedelta(days=14)
-            rng.append(pd.Timestamp(dt))
+        rng = pd.date_range(start_date + timedelta(days=14), end=end_date,
+                            freq='14D')
     else:
-        # undefined
-        print('unknown frequency')
-        rng = []
+        raise ValueError(f'unknown frequency: {frequency!r}')
 
     return rng
 
 
+def get_elapsed_months(dates, start_date):
+    """
+    Whole months elapsed from start_date to each date. Matches
+    relativedelta(date, start_date).years * 12 + months
+
+    Parameters
+    ----------
+    dates : DatetimeIndex
+        Dates on or after start_date
+    start_date : date
+        Start date of the projection
+
+    Returns
+    -------
+    A numpy array of elapsed months
+
+    """
+    dates = pd.DatetimeIndex(dates)
+    start = pd.Timestamp(start_date)
+
+    # whole months, less one if the monthly anniversary hasn't been reached.
+    # the anniversary is moved to the last day of shorter months
+    months = ((dates.year.values - start.year) * 12
+              + (dates.month.values - start.month))
+    anniversary = np.minimum(start.day, dates.days_in_month.values)
+    return months - (dates.day.values < anniversary)
+
+
+def get_elapsed_years(dates, start_date):
+    """
+    Elapsed time from start_date to each date in years, counting whole
+    months only. Matches relativedelta(date, start_date).years + months/12
+
+    Parameters
+    ----------
+    dates : DatetimeIndex
+        Dates on or after start_date
+    start_date : date
+        Start date of the projection
+
+    Returns
+    -------
+    A numpy array of elapsed years
+
+    """
+    yrs, months = np.divmod(get_elapsed_months(dates, start_date), 12)
+    return yrs + months / 12
+
+
+@njit(cache=True)
+def _amortize(mortgage, price, ir, app, fees, payment, is_pay, prepay_idx,
+              prepay_amt):
+    """
+    Amortization recurrence used by get_amortization. Steps through the daily
+    schedule until the mortgage is paid off, rows after pay-off are left as 0
+
+    Parameters
+    ----------
+    mortgage : float
+        Starting mortgage balance
+    price : float
+        Property purchase price
+    ir : float
+        Daily interest rate
+    app : float
+        Daily appreciation rate
+    fees : float
+        Real estate fees as a fraction
+    payment : float
+        Payment amount on pay periods
+    is_pay : array of bool
+        True for each day that is a pay period
+    prepay_idx : array of int
+        Row index of each prepayment
+    prepay_amt : array of float
+        Amount of each prepayment
+
+    Returns
+    -------
+    Arrays of start, payment, interest, end, value, equity and prepayment
+    by day, and the index of the last day of the schedule
+
+    """
+    n = is_pay.shape[0]
+    start = np.zeros(n)
+    pays = np.zeros(n)
+    interest = np.zeros(n)
+    ends = np.zeros(n)
+    values = np.zeros(n)
+    equity = np.zeros(n)
+    prepay = np.zeros(n)
+    for i in range(prepay_idx.shape[0]):
+        prepay[prepay_idx[i]] = prepay_amt[i]
+
+    balance = mortgage
+    value = price
+    last = n - 1
+    for i in range(n):
+        # add payment if it's a pay period according to the frequency
+        pay = payment if is_pay[i] else 0.0
+
+        # calc interest and end balance
+        int_pay = (balance - pay - prepay[i]) * ir
+        end = balance + int_pay - pay - prepay[i]
+
+        # calc appreciation
+        value = value * (1 + app)
+
+        start[i] = balance
+        values[i] = value
+        equity[i] = (value - end) - (value * fees)
+        if end > 0:
+            pays[i] = pay
+            interest[i] = int_pay
+            ends[i] = end
+            balance = end
+        else:
+            # mortgage paid off
+            pays[i] = balance
+            last = i
+            break
+
+    return start, pays, interest, ends, values, equity, prepay, last
+
+
+def _amortize_vectorized(mortgage, price, ir, app, fees, payment, is_pay,
+                         prepay_idx, prepay_amt):
+    """
+    Closed form of _amortize in numpy, used when numba isn't installed.
+    Parameters and returns are the same as _amortize
+
+    Each day the balance less the day's payments grows by (1 + ir), so the
+    end balance on day i is the compounded mortgage less the compounded
+    payments: end[i] = (1 + ir)^(i+1) * (mortgage - sum(flows[j] / (1 + ir)^j))
+
+    """
+    n = is_pay.shape[0]
+    prepay = np.zeros(n)
+    prepay[prepay_idx] = prepay_amt
+    pays = np.where(is_pay, payment, 0.0)
+    flows = pays + prepay
+
+    # end balance, the start balance is the previous day's end
+    growth = (1 + ir) ** np.arange(1, n + 1)
+    ends = growth * (mortgage - np.cumsum(flows * (1 + ir) / growth))
+    start = np.concatenate(([mortgage], ends[:-1]))
+    interest = (start - flows) * ir
+
+    # calc appreciation and equity
+    values = price * (1 + app) ** np.arange(1, n + 1)
+    equity = (values - ends) - (values * fees)
+
+    # mortgage paid off, the last payment clears the balance
+    paid = ends <= 0
+    if not paid.any():
+        return start, pays, interest, ends, values, equity, prepay, n - 1
+
+    last = int(np.argmax(paid))
+    pays[last] = start[last]
+    interest[last] = 0
+    ends[last] = 0
+    for arr in (start, pays, interest, ends, values, equity):
+        arr[last + 1:] = 0
+
+    return start, pays, interest, ends, values, equity, prepay, last
+
+
+@njit(cache=True)
+def _invest(deposit, inv, contrib, is_pay, equity):
+    """
+    Investment recurrence used by get_rent_vs_own. The deposit is invested on
+    the first day, contributions are added on pay periods and the balance
+    compounds daily
+
+    Parameters
+    ----------
+    deposit : float
+        Downpayment invested on the first day
+    inv : float
+        Daily investment rate
+    contrib : float
+        Amount invested on pay periods (taxes, fees, mortgage/rent difference)
+    is_pay : array of bool
+        True for each day that is a pay period
+    equity : array of float
+        Mortgage equity by day, used to find the cross-over points
+
+    Returns
+    -------
+    Arrays of invest start, invest end and cross-over (1 on the days renting
+    and owning swap places) by day
+
+    """
+    n = is_pay.shape[0]
+    start = np.zeros(n)
+    ends = np.zeros(n)
+    cross_over = np.zeros(n, dtype=np.int64)
+
+    balance = deposit
+    rent = True
+    for i in range(n):
+        start[i] = balance
+
+        # invest on pay periods after the first day, compound daily
+        if i > 0 and is_pay[i]:
+            balance = balance + contrib
+        balance = balance * (1 + inv)
+        ends[i] = balance
+
+        # find dates where the equity/rental plots will cross
+        prev = rent
+        rent = balance > equity[i]
+        if i > 0 and rent != prev:
+            cross_over[i] = 1
+
+    return start, ends, cross_over
+
+
+def _invest_vectorized(deposit, inv, contrib, is_pay, equity):
+    """
+    Closed form of _invest in numpy, used when numba isn't installed.
+    Parameters and returns are the same as _invest
+
+    Each day the balance plus the day's contribution grows by (1 + inv), so
+    the end balance on day i is the compounded deposit plus the compounded
+    contributions: end[i] = (1 + inv)^(i+1) * (deposit + sum(c[j] / (1 + inv)^j))
+
+    """
+    n = is_pay.shape[0]
+    flows = np.where(is_pay, contrib, 0.0)
+    flows[0] = 0
+
+    # end balance, the start balance is the previous day's end
+    growth = (1 + inv) ** np.arange(1, n + 1)
+    ends = growth * (deposit + np.cumsum(flows * (1 + inv) / growth))
+    start = np.concatenate(([deposit], ends[:-1]))
+
+    # find dates where the equity/rental plots will cross
+    rent = ends > equity
+    cross_over = np.zeros(n, dtype=np.int64)
+    cross_over[1:] = rent[1:] != rent[:-1]
+
+    return start, ends, cross_over
 
 
 def get_amortization(start_date, price, deposit, payment, yrs, int_rate, app_rate,
@@ -118,11 +389,14 @@ def get_amortization(start_date, price, deposit, payment, yrs, int_rate, app_rat
         real estate fees - used to calculate mortgage equity on sale
     prepayments : List of dicts
         A list of dicts containing prepayments {date, amount}
-    scenarios : List of dicts
-        A list of dicts containing saved scearios (date,end)
+    scenarios : dict of lists
+        Saved scenarios, a date column and an end balance column per
+        scenario (output from save_scenario)
     Returns
     -------
-    A dataframe with the amortization schedule
+    A dataframe with the amortization schedule (the payment frequency is kept
+    in df.attrs), the pay-off date, the total interest paid and the maximum
+    equity
 
     """
 
@@ -134,100 +408,126 @@ def get_amortization(start_date, price, deposit, payment, yrs, int_rate, app_rat
     date_rng = get_periods(start_date, yrs, 'd')  # daily range
     pay_rng = get_periods(start_date, yrs, frequency)  # pay-periods
 
-    # init the dataframe
-    df = pd.DataFrame(date_rng, columns=['date'])
-    df['frequency'] = frequency
-    df['pay_period'] = False
-    df['start'] = 0.0
-    df['payment'] = 0.0
-    df['prepayment'] = 0.0
-    df['interest'] = 0.0
-    df['end'] = 0.0
-    df['value'] = 0.0
-    df['equity'] = 0.0
-    df['elapsed_years'] = 0
-
-    # add prepayments
-    if prepayments is not None:
-        for prepayment in prepayments:
-
-            # get the index for the prepayment date
-            idx = df[df.date == prepayment['date']].index.values.astype(int)[0]
-
-            # add the prepayment
-            df.at[idx, 'prepayment'] = prepayment['value']
+    # flag the days where a payment is made according to the frequency, both
+    # ranges are sorted so the pay-periods can be located with a binary search
+    pos = date_rng.searchsorted(pay_rng)
+    found = pos < len(date_rng)
+    pos = pos[found][date_rng[pos[found]] == pay_rng[found]]
+    is_pay = np.zeros(len(date_rng), dtype=bool)
+    is_pay[pos] = True
+
+    # get the index/value of each prepayment, dates that aren't in the
+    # schedule are skipped
+    prepayments = prepayments or []
+    prepay_dates = pd.to_datetime([p['date'] for p in prepayments],
+                                  errors='coerce')
+    prepay_idx = date_rng.get_indexer(prepay_dates).astype(np.int64)
+    prepay_amt = np.array([p['value'] for p in prepayments], dtype=np.float64)
+    found = prepay_idx >= 0
+    prepay_idx, prepay_amt = prepay_idx[found], prepay_amt[found]
 
     # create the amortization schedule
-    for idx, row in df.iterrows():
+    if _amortize_aot is not None:
+        amortize = _amortize_aot
+    elif NUMBA_AVAILABLE:
+        amortize = _amortize
+    else:
+        amortize = _amortize_vectorized
+    start, pay, interest, end, value, equity, prepay, last = amortize(
+        mortgage, price, ir, app, fees, float(payment), is_pay, prepay_idx,
+        prepay_amt)
+    end_date = date_rng[last]
+
+    # get elapsed time, undefined after the mortgage is paid off
+    elapsed_yrs = get_elapsed_years(date_rng, start_date)
+    elapsed_yrs[last + 1:] = np.nan
+
+    df = pd.DataFrame({
+        'date': date_rng,
+        'pay_period': is_pay,
+        'start': start,
+        'payment': pay,
+        'prepayment': prepay,
+        'interest': interest,
+        'end': end,
+        'value': value,
+        'equity': equity,
+        'elapsed_years': 0,
+        'elapsed_yrs': elapsed_yrs,
+    })
+
+    # the frequency is the same for every row, keep it as metadata rather
+    # than an object column
+    df.attrs['frequency'] = frequency
 
-        # first period
-        if idx == 0:
-            df.at[0, 'start'] = mortgage
-            end_date = start_date
-            value = price
+    # add scenarios if provided
+    if scenarios is not None:
+        df = add_scenarios(df, scenarios)
 
-        # add payment if it's a pay period according to the frequency selected
-        if row.date in pay_rng:
-            pay = payment
-        else:
-            pay = 0
+    return df, end_date, interest.sum(), equity.max()
 
-        # calc interest
-        int_pay = (df.at[idx, 'start'] - pay - df.at[idx, 'prepayment']) * ir
 
-        # calc end balance
-        end = df.at[idx, 'start'] + int_pay - pay - df.at[idx, 'prepayment']
+def add_scenarios(df, scenarios):
+    """
+    Join saved scenarios onto an amortization schedule by date. Kept separate
+    from get_amortization so a cached schedule can be reused while the saved
+    scenarios change
 
-        # calc appreciation
-        value = value * (1 + app)
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the amortization schedule (output from get_amortization)
+    scenarios : dict of lists
+        Saved scenarios, a date column and an end balance column per
+        scenario (output from save_scenario)
 
-        # update amortization schedule
-        if end > 0:
-            # update schedule
-            df.at[idx, 'payment'] = pay
-            df.at[idx, 'interest'] = int_pay
-            df.at[idx, 'end'] = end
-            df.at[idx, 'value'] = value
-            df.at[idx, 'equity'] = (value - end) - (value * fees)
-            df.at[idx + 1, 'start'] = end
-            end_date = df.at[idx, 'date']
-
-            # get elapsed time
-            diff = relativedelta(end_date, start_date)
-            diff_yrs = diff.years + diff.months/12
-            df.at[idx, 'elapsed_yrs'] = diff_yrs
+    Returns
+    -------
+    A new dataframe with a column per scenario
 
-        else:
-            # mortgage paid off
-            df.at[idx, 'payment'] = df.at[idx, 'start']
-            df.at[idx, 'interest'] = 0
-            df.at[idx, 'end'] = 0
-            df.at[idx, 'value'] = value
-            df.at[idx, 'equity'] = (value - end) - (value * fees)
-            end_date = df.at[idx, 'date']
-
-            # get elapsed time
-            diff = relativedelta(end_date, start_date)
-            diff_yrs = diff.years + diff.months/12
-            df.at[idx, 'elapsed_yrs'] = diff_yrs
-            break
+    """
+    attrs = df.attrs
 
-    # add scenarios if provided
-    if scenarios is not None:
-        # add the scenarios
-        # scenario_store will be a list of dicts, convert to df
-        scenarios_df = pd.DataFrame(scenarios)
-        scenarios_df['date'] = pd.to_datetime(scenarios_df['date']).dt.date
+    # scenario_store will be a dict of columns, convert to df
+    scenarios_df = pd.DataFrame(scenarios)
+    scenarios_df['date'] = pd.to_datetime(scenarios_df['date'])
+
+    # join scenarios with current df based on date. Scenarios are saved by
+    # month, fill the days in between from the following month end
+    scenarios_df = scenarios_df.set_index('date')
+    df = df.set_index('date').join(scenarios_df, how='left')
+    df[scenarios_df.columns] = df[scenarios_df.columns].bfill()
+    df.reset_index(inplace=True)
+    df.rename(columns={'index': 'date'}, inplace=True)
+
+    # the join doesn't carry over metadata (frequency), copy it back
+    df.attrs.update(attrs)
 
-        # join scenarios with current df based on date
-        df = df.set_index('date').join(scenarios_df.set_index('date'), how='inner')
-        df.reset_index(inplace=True)
-        df.rename(columns={'index': 'date'}, inplace=True)
+    return df
+
+
+def get_month_ends(dates, end_date=None):
+    """
+    Flag the first date and the last date of each month. Used to thin out the
+    daily schedule for plotting and saved scenarios
+
+    Parameters
+    ----------
+    dates : Series of datetime
+        Daily dates of an amortization schedule
+    end_date : datetime, optional
+        Pay-off date, also flagged when provided
+
+    Returns
+    -------
+    A boolean Series
 
-    # return the dataframe, exclcude nan rows (happens
-    # when the mortgage isn't paid after 25 years)
-    df = df[~df.date.isnull()]
-    return df, end_date
+    """
+    keep = dates.dt.month.diff(-1) != 0
+    keep.iloc[0] = True
+    if end_date is not None:
+        keep |= dates == end_date
+    return keep
 
 
 def get_georeturn(rate, frequency='d'):
@@ -236,24 +536,18 @@ def get_georeturn(rate, frequency='d'):
 
     Parameters
     ----------
-    rate : float
+    rate : float or array of floats
         Annual rate of return (5.0)==5.0%
     frequency : string
-        Frequency to convert to: m=monthly, d=daily
+        Frequency to convert to: m=monthly, b=bi-monthly, d=daily
 
     Returns
     -------
-    float
+    float or array of floats
 
     """
-    r = rate / 100
-
-    if frequency == 'm':
-        return (1 + r) ** (1 / 12) - 1
-    elif frequency == 'd':
-        return (1 + r) ** (1 / 365) - 1
-    else:
-        print('frequency not recongized')
+    # expm1/log1p keep precision for small rates
+    return np.expm1(np.log1p(np.divide(rate, 100)) / PERIODS_PER_YEAR[frequency])
 
 
 def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
@@ -273,34 +567,35 @@ def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
 
     """
 
-    # copy df
-    df = df_amort.copy()
-
     # get the number of years to pay-off
-    if df.end.min() > 0:
+    if df_amort.end.min() > 0:
         diff_yrs = "> 25 "
     else:
-        diff = relativedelta(end_date, df.date.min())
-        diff_yrs = str(diff.years)
+        diff_yrs = str(get_elapsed_months([end_date], df_amort.date.min())[0] // 12)
+
+    # get cumulative interest, the last value is the total
+    cum_interest = df_amort.interest.to_numpy().cumsum()
+    total_interest = cum_interest[-1]
 
-    # get cumulative interest
-    df['cum_interest'] = df.interest.cumsum()
-    total_interest = df.interest.sum()
+    # plot the first day, the last day of each month and the pay-off day
+    # rather than every day, totals above are taken from the full schedule.
+    # Only the plotted rows are copied, rounded to cents to keep the hover
+    # text clean and the figure json small
+    keep = get_month_ends(df_amort.date, end_date).to_numpy()
+    df = df_amort[keep].round(2)
+    cum_interest = cum_interest[keep].round(2)
 
     # sub-title text
     subtitle = f'Amortization:{diff_yrs} Years | Total Interest:${total_interest:,.0f}'
 
-    # get extra data for hovertext
-    cols = ['elapsed_yrs', 'equity', 'cum_interest']
-
-    # check for scenarios, add them to cols
+    # check for scenarios
     scenarios = [c for c in df.columns if 'scenario' in c]
-    if len(scenarios) > 0:
-        for s in scenarios:
-            cols.append(s)
 
-    # create the custome text dataframe for hover data
-    customdata = df[cols]
+    # create the custome text array for hover data: elapsed years, equity,
+    # cumulative interest then the scenarios
+    customdata = np.column_stack([df[['elapsed_yrs', 'equity']].to_numpy(),
+                                  cum_interest,
+                                  df[scenarios].to_numpy()])
 
     # create hover data for the current parameters
     hover_text = """<b>Current Values</b><br>
@@ -321,15 +616,16 @@ def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
     # this removes the default hover data
     hover_text += "<extra></extra>"
 
-    # create plots
+    # create plots, traces are passed arrays rather than Series
     fig = go.Figure()
+    x = df.date.to_numpy()
 
     # outstanding mortgage
     fig.add_trace(
         go.Scattergl(
             name='Mortgage',
-            x=df.date,
-            y=df.end,
+            x=x,
+            y=df.end.to_numpy(),
             line=dict(color='#536872'),
             fill='tozeroy',
             customdata=customdata,
@@ -341,8 +637,8 @@ def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
     fig.add_trace(
         go.Scattergl(
             name='Interest',
-            x=df.date,
-            y=df.cum_interest,
+            x=x,
+            y=cum_interest,
             line=dict(color='#E95420'),
             fill='tozeroy',
             hoverinfo='skip'
@@ -367,8 +663,8 @@ def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
             fig.add_trace(
                 go.Scattergl(
                     name=scen,
-                    x=df.date,
-                    y=df[scen],
+                    x=x,
+                    y=df[scen].to_numpy(),
                     line=dict(color=colors[i], dash=dash[i], width=3),
                     hoverinfo='skip'
                 )
@@ -387,7 +683,10 @@ def plot_amortization(df_amort, end_date, yrs=[5, 10, 15]):
         hoverlabel=dict(
                 bgcolor="#E95420",
                 font_size=14,
-                )
+                ),
+        # keep the user's zoom/pan when the figure is replaced, reset it when
+        # the schedule's start or pay-off date moves
+        uirevision=f'{df.date.iloc[0]:%Y-%m-%d}/{end_date:%Y-%m-%d}'
     )
 
     return fig
@@ -398,17 +697,50 @@ def get_rent_vs_own(start_date, price, deposit, payment, yrs, int_rate, app_rate
                     inv_rate, monthly_main, annual_tax):
 
     # get the mortgage amortization schedule
-    df, end_date = get_amortization(start_date, price, deposit, payment, yrs,
-                                    int_rate, app_rate, frequency, re_fees)
+    df, end_date, _, _ = get_amortization(start_date, price, deposit, payment,
+                                          yrs, int_rate, app_rate, frequency,
+                                          re_fees)
+
+    return add_investment(df, end_date, deposit, payment, frequency,
+                          monthly_rent, inv_rate, monthly_main, annual_tax)
+
+
+def add_investment(df, end_date, deposit, payment, frequency, monthly_rent,
+                   inv_rate, monthly_main, annual_tax):
+    """
+    Add the rent/investment comparison to an amortization schedule. Kept
+    separate from get_rent_vs_own so a cached schedule can be reused
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the amortization schedule (output from get_amortization)
+    end_date : datetime
+        Pay-off date (output from get_amortization)
+    deposit : float
+        Downpayment, invested on the first day instead
+    payment : float
+        Mortgage payment, matching the frequency
+    frequency : string
+        frequency of payment: m-monthly, b=bi-weekly, a=accelerated
+    monthly_rent : float
+        Monthly rent
+    inv_rate : float (percent *100)
+        Annual investment rate of return (8% = 8.0)
+    monthly_main : float
+        Monthly maintenance fees
+    annual_tax : float
+        Annual property taxes
 
-    # remove rows after the mortgage amortization is complete
-    df = df[df.date <= end_date]
+    Returns
+    -------
+    A new dataframe up to the pay-off date with investment columns
 
-    # add investment columns
-    df['invest_start'] = 0
-    df['invest_end'] = 0
-    df['cross_over_tmp'] = 'r'
-    df['cross_over'] = 0
+    """
+
+    # remove rows after the mortgage amortization is complete. The schedule
+    # is built from a date range so there are no missing dates to filter
+    df = df[df.date <= end_date].copy()
 
     # convert invest rates and fees to match frequency
     inv = get_georeturn(inv_rate, 'd')
@@ -429,48 +761,21 @@ def get_rent_vs_own(start_date, price, deposit, payment, yrs, int_rate, app_rate
         main = monthly_main * 12 / 26
         rent = monthly_rent * 12 / 26
 
-    # calculate the investment returns
-    for idx, row in df.iterrows():
-        # first period. invest the downpayment + tax + main +
-        # mortgage/rent difference
-
-        if idx == 0:
-            # first period, invest the downpayment at the daily invest rate
-            invest = deposit
-            df.at[idx, 'invest_start'] = deposit
-
-            # calc the daily capital gains, roll the balance forward
-            cap_gains = invest * (1 + inv)
-            df.at[idx, 'invest_end'] = cap_gains
-            df.at[idx + 1, 'invest_start'] = cap_gains
-        elif df.at[idx, 'payment'] > 0:
-            # payment period.  Invest the taxes, maintenence fees, mortgage
-            # payment savings
-            invest = df.at[idx, 'invest_start'] + tax + main + (payment - rent)
-            cap_gains = invest * (1 + inv)
-            df.at[idx, 'invest_end'] = cap_gains
-            df.at[idx + 1, 'invest_start'] = cap_gains
-        elif df.at[idx, 'payment'] == 0:
-            # non-payment period, compound investment gains
-            cap_gains = df.at[idx, 'invest_start'] * (1 + inv)
-            df.at[idx, 'invest_end'] = cap_gains
-            df.at[idx + 1, 'invest_start'] = cap_gains
-
-        # find cross-over points
-        if df.at[idx, 'invest_end'] > df.at[idx, 'equity']:
-            df.at[idx, 'cross_over_tmp'] = 'r'
-        else:
-            df.at[idx, 'cross_over_tmp'] = 'o'
-        # find dates where the equity/rental plots will cross
-        if idx > 0:
-            if df.at[idx-1, 'cross_over_tmp'] != df.at[idx, 'cross_over_tmp']:
-                df.at[idx, 'cross_over'] = 1
-
-    # remove temp column
-    df.drop(columns=(['cross_over_tmp']), inplace=True)
-
-    # when the mortgage isn't paid after 25 years)
-    df = df[~df.date.isnull()]
+    # calculate the investment returns. Invest the downpayment, then the
+    # taxes, maintenence fees and mortgage payment savings each pay period
+    contrib = tax + main + (payment - rent)
+    if _invest_aot is not None:
+        invest = _invest_aot
+    elif NUMBA_AVAILABLE:
+        invest = _invest
+    else:
+        invest = _invest_vectorized
+    invest_start, invest_end, cross_over = invest(
+        float(deposit), inv, float(contrib), df.payment.values > 0,
+        df.equity.values)
+    df['invest_start'] = invest_start
+    df['invest_end'] = invest_end
+    df['cross_over'] = cross_over
 
     return df
 
@@ -490,21 +795,28 @@ def plot_rent_vs_own(df):
     Plotly figure
 
     """
+    # plot the first day, the last day of each month and the cross-over days
+    # rather than every day. Only the plotted rows are copied, rounded to cents
+    # to keep the hover text clean and the figure json small
+    df = df[get_month_ends(df.date) | (df.cross_over == 1)].round(2)
+
     # get cross-over date (if they exist)
     cross_overs = df[df.cross_over == 1]
 
     # create the plot
     fig = go.Figure()
     
-    # get custom data for hover text
-    customdata = list(zip(df.invest_end,df.elapsed_yrs))
+    # get custom data for hover text, traces are passed arrays rather than
+    # Series
+    customdata = df[['invest_end', 'elapsed_yrs']].to_numpy()
+    x = df.date.to_numpy()
 
     # mortgage equity
     fig.add_trace(
         go.Scattergl(
             name='Mortgage Equity',
-            x=df.date,
-            y=df.equity,
+            x=x,
+            y=df.equity.to_numpy(),
             customdata=customdata,
             line=dict(color='#536872', width=3),
             hovertemplate = """<b>Mortgage Equity:</b> $%{y:,.0f} 
@@ -518,8 +830,8 @@ def plot_rent_vs_own(df):
     fig.add_trace(
         go.Scattergl(
             name='Rent/Investment Equity',
-            x=df.date,
-            y=df.invest_end,
+            x=x,
+            y=df.invest_end.to_numpy(),
             line=dict(color='#E95420', width=3),
             hoverinfo='skip',
         )
@@ -527,19 +839,16 @@ def plot_rent_vs_own(df):
 
     # add cross-over annotations if they exist
     if cross_overs.shape[0] >= 1:
-        for idx, row in cross_overs.iterrows():
-            # get the date/value of cross-over
-            cross_over_date = df.at[idx, 'date']
-            cross_over_value = df.at[idx, 'equity']
+        for row in cross_overs.itertuples():
+            # the number of years before cross-over
+            diff_str = f"{row.elapsed_yrs:.2f} Years"
 
-            # calculate the number of years before cross-over
-            diff = relativedelta(cross_over_date, df.date.min())
-            diff_str = f"{diff.years + diff.months/12:.2f} Years"
-
-            # add the annotation
+            # add the annotation at the date/value of cross-over. A datetime
+            # rather than a Timestamp keeps plotly's json encoding on its
+            # fast path
             fig.add_annotation(
-                x=cross_over_date,
-                y=cross_over_value,
+                x=row.date.to_pydatetime(),
+                y=row.equity,
                 text=diff_str,
                 showarrow=True,
                 arrowhead=1,
@@ -573,7 +882,8 @@ def plot_rent_vs_own(df):
 
 def save_scenario(df, scenario_name, scenarios=None):
     """
-    Save an amortization schedule as a scenario. Used in a store variable
+    Save an amortization schedule as a scenario. Used in a store variable.
+    Only the first day and month ends are saved, the dates that are plotted
 
     Parameters
     ----------
@@ -582,41 +892,32 @@ def save_scenario(df, scenario_name, scenarios=None):
         get_amortization
     scenario_name : string
         Scenario name. Used in plot_amortization
-    scenarios : list of dicts, optional
-        Saved scenarios.  New scenarios are appended. From the scenario-store
-        variable in the dash-app
+    scenarios : dict of lists, optional
+        Saved scenarios.  New scenarios are added as a column. From the
+        scenario-store variable in the dash-app
 
     Returns
     -------
-    TYPE
-        DESCRIPTION.
+    A dict of lists, the date column and an end balance column per scenario
 
     """
 
-    # save the current scenario
     scen_name = 'scenario-' + scenario_name
-    df_new = df[['date', 'end']].copy()
-    df_new.columns = ['date', scen_name]
-    df_new['date'] = pd.to_datetime(df_new['date']).dt.date
-    df_new['date'] = df_new['date'].astype('datetime64')
+    end = df.set_index('date').end
 
-    # combine with exisitng scenarios
-    if scenarios is not None:
-        # get stored scenarios as a dataframe
-        df_old = pd.DataFrame(scenarios)
-        df_old['date'] = pd.to_datetime(df_old['date']).dt.date
-        df_old['date'] = df_old['date'].astype('datetime64')
-
-        # join with the new scenario by date
-        df_new = df_old.set_index('date').join(df_new.set_index('date'), how='inner')
-        df_new.reset_index(inplace=True)
-        df_new.rename(columns={'index': 'date'}, inplace=True)
-        df_new['date'] = pd.to_datetime(df_new['date']).dt.date
-        df_new['date'] = df_new['date'].astype('datetime64')
-        
-    return df_new.to_dict('records')
-
-# df, end_date = get_amortization(START_DATE, PRICE, DEPOSIT, PAY, YRS, IR, APP_RATE, 'm', RE_FEES)
+    if scenarios is None:
+        # the first scenario sets the dates
+        end = end[get_month_ends(df.date).values]
+        scenarios = {'date': end.index.strftime('%Y-%m-%d').tolist()}
+    else:
+        # line up the new scenario with the saved dates
+        end = end.reindex(pd.to_datetime(scenarios['date']))
+
+    scenarios[scen_name] = end.tolist()
+
+    return scenarios
+
+# df, end_date, _, _ = get_amortization(START_DATE, PRICE, DEPOSIT, PAY, YRS, IR, APP_RATE, 'm', RE_FEES)
 # fig=plot_amortization(df, end_date)
 # fig.show()
 
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for loan_calc. Run with: python -m pytest
+"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+from dateutil.relativedelta import relativedelta
+
+import loan_calc
+
+
+def _py(kernel):
+    """
+    The python implementation of a kernel, njit functions keep it as py_func
+    (without numba the kernel is already plain python)
+    """
+    return getattr(kernel, 'py_func', kernel)
+
+
+def _pay_days(frequency, yrs=25):
+    """
+    Pay-day mask over the daily range, as built in get_amortization
+    """
+    start_date = date(2021, 1, 1)
+    date_rng = loan_calc.get_periods(start_date, yrs, 'd')
+    return date_rng.isin(loan_calc.get_periods(start_date, yrs, frequency))
+
+
+def _amortize_args(frequency, payment, int_rate, app_rate, prepayments):
+    """
+    Arguments for _amortize (and its fallbacks) for an AMORT_CASES entry
+    """
+    prepay_idx = np.array(list(prepayments), dtype=np.int64)
+    prepay_amt = np.array(list(prepayments.values()), dtype=np.float64)
+    return (760000.0, 900000.0, loan_calc.get_georeturn(int_rate, 'd'),
+            loan_calc.get_georeturn(app_rate, 'd'), 0.05, float(payment),
+            _pay_days(frequency), prepay_idx, prepay_amt)
+
+
+def _invest_args(frequency, deposit, inv_rate, contrib):
+    """
+    Arguments for _invest (and its fallbacks) for an INVEST_CASES entry, the
+    equity is taken from a mortgage on the same pay days
+    """
+    is_pay = _pay_days(frequency)
+    equity = loan_calc._amortize_vectorized(
+        760000.0, 900000.0, loan_calc.get_georeturn(3.0, 'd'),
+        loan_calc.get_georeturn(5.0, 'd'), 0.05, 3000.0, is_pay,
+        np.zeros(0, dtype=np.int64), np.zeros(0))[5]
+    return (float(deposit), loan_calc.get_georeturn(inv_rate, 'd'),
+            float(contrib), is_pay, equity)
+
+
+def _assert_amortize_equal(result, expected):
+    # last (pay-off index) is exact, the arrays agree to rounding
+    assert result[-1] == expected[-1]
+    for res, exp in zip(result[:-1], expected[:-1]):
+        np.testing.assert_allclose(res, exp, rtol=1e-9, atol=1e-6)
+
+
+def _assert_invest_equal(result, expected):
+    np.testing.assert_allclose(result[0], expected[0], rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(result[1], expected[1], rtol=1e-9, atol=1e-6)
+    np.testing.assert_array_equal(result[2], expected[2])
+
+
+# (frequency, payment, int_rate, app_rate, prepayments {index: value})
+AMORT_CASES = [
+    ('m', 4500, 3.0, 5.0, {}),            # paid off within the term
+    ('m', 1500, 6.0, 2.0, {}),            # not paid off
+    ('b', 1400, 2.5, -3.0, {}),           # depreciating home value
+    ('a', 2000, 4.0, 3.0, {400: 20000, 2000: 50000}),
+    ('m', 2500, 3.5, 4.0, {30: 900000}),  # prepayment clears the balance
+]
+
+
+@pytest.mark.parametrize('frequency, payment, int_rate, app_rate, prepayments',
+                         AMORT_CASES)
+def test_amortize_vectorized_matches_kernel(frequency, payment, int_rate,
+                                            app_rate, prepayments):
+    args = _amortize_args(frequency, payment, int_rate, app_rate, prepayments)
+    _assert_amortize_equal(loan_calc._amortize_vectorized(*args),
+                           _py(loan_calc._amortize)(*args))
+
+
+def test_get_periods_unknown_frequency():
+    with pytest.raises(ValueError):
+        loan_calc.get_periods(date(2021, 1, 1), 25, 'x')
+
+
+# (frequency, deposit, inv_rate, contribution per pay period)
+INVEST_CASES = [
+    ('m', 140000, 8.0, 1500),
+    ('b', 140000, 10.0, -600),   # rent above the mortgage payment
+    ('a', 50000, -5.0, 400),     # losing investment
+    ('m', 0, 6.0, 0),
+]
+
+
+@pytest.mark.parametrize('frequency, deposit, inv_rate, contrib',
+                         INVEST_CASES)
+def test_invest_vectorized_matches_kernel(frequency, deposit, inv_rate,
+                                          contrib):
+    args = _invest_args(frequency, deposit, inv_rate, contrib)
+    _assert_invest_equal(loan_calc._invest_vectorized(*args),
+                         _py(loan_calc._invest)(*args))
+
+
+# The precompiled module (build_aot.py) is preferred whenever it can be
+# imported, these fail when it is stale after a change to the kernels
+@pytest.mark.parametrize('frequency, payment, int_rate, app_rate, prepayments',
+                         AMORT_CASES)
+def test_amortize_aot_matches_kernel(frequency, payment, int_rate, app_rate,
+                                     prepayments):
+    aot = pytest.importorskip('loan_calc_aot')
+    args = _amortize_args(frequency, payment, int_rate, app_rate, prepayments)
+    _assert_amortize_equal(aot.amortize(*args),
+                           _py(loan_calc._amortize)(*args))
+
+
+@pytest.mark.parametrize('frequency, deposit, inv_rate, contrib',
+                         INVEST_CASES)
+def test_invest_aot_matches_kernel(frequency, deposit, inv_rate, contrib):
+    aot = pytest.importorskip('loan_calc_aot')
+    args = _invest_args(frequency, deposit, inv_rate, contrib)
+    _assert_invest_equal(aot.invest(*args), _py(loan_calc._invest)(*args))
+
+
+def test_amortization_keeps_frequency_with_scenarios():
+    args = (date(2021, 1, 1), 900000, 140000, 3000, 25, 3.0, 5.0, 'b', 5.0)
+    df = loan_calc.get_amortization(*args)[0]
+    assert df.attrs == {'frequency': 'b'}
+
+    scenarios = loan_calc.save_scenario(df, 'a')
+    df = loan_calc.get_amortization(*args, None, scenarios)[0]
+    assert df.attrs == {'frequency': 'b'}
+    assert 'scenario-a' in df.columns
+
+
+def _rd_months(end, start):
+    diff = relativedelta(end, start)
+    return diff.years * 12 + diff.months
+
+
+# (start date, end date)
+ELAPSED_CASES = [
+    (date(2021, 3, 10), date(2021, 3, 10)),   # same day
+    (date(2021, 1, 31), date(2021, 2, 27)),   # Jan 31 -> Feb 28
+    (date(2021, 1, 31), date(2021, 2, 28)),
+    (date(2021, 1, 31), date(2021, 3, 30)),
+    (date(2021, 1, 31), date(2021, 3, 31)),
+    (date(2020, 1, 31), date(2020, 2, 28)),   # Jan 31 -> Feb 29 (leap)
+    (date(2020, 1, 31), date(2020, 2, 29)),
+    (date(2020, 2, 29), date(2020, 3, 28)),   # Feb 29 start
+    (date(2020, 2, 29), date(2020, 3, 29)),
+    (date(2020, 2, 29), date(2021, 2, 28)),
+    (date(2020, 2, 29), date(2021, 3, 1)),
+    (date(2020, 2, 29), date(2024, 2, 28)),
+    (date(2020, 2, 29), date(2024, 2, 29)),
+    (date(2021, 1, 15), date(2021, 3, 14)),   # day before/of an anniversary
+    (date(2021, 1, 15), date(2021, 3, 15)),
+    (date(2021, 4, 30), date(2021, 5, 29)),
+    (date(2021, 4, 30), date(2021, 5, 30)),
+    (date(2021, 12, 31), date(2022, 1, 1)),   # year boundaries
+    (date(2021, 12, 31), date(2022, 1, 31)),
+    (date(2021, 12, 15), date(2022, 12, 14)),
+    (date(2021, 12, 15), date(2022, 12, 15)),
+    (date(2021, 11, 30), date(2047, 1, 29)),
+    (date(2021, 11, 30), date(2047, 1, 30)),
+]
+
+
+@pytest.mark.parametrize('start_date, end_date', ELAPSED_CASES)
+def test_elapsed_months_matches_relativedelta(start_date, end_date):
+    months = loan_calc.get_elapsed_months([end_date], start_date)[0]
+    assert months == _rd_months(end_date, start_date)
+
+
+@pytest.mark.parametrize('start_date', [date(2020, 1, 31), date(2020, 2, 29),
+                                        date(2021, 8, 30)])
+def test_elapsed_months_matches_relativedelta_daily(start_date):
+    date_rng = loan_calc.get_periods(start_date, 25, 'd')
+    expected = [_rd_months(d.date(), start_date) for d in date_rng]
+    np.testing.assert_array_equal(
+        loan_calc.get_elapsed_months(date_rng, start_date), expected)
@@ -11,14 +11,20 @@ import dash
 from dash import html
 from dash import dcc
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from datetime import date
-from dateutil.relativedelta import relativedelta
+from functools import lru_cache
+import json
 import loan_calc
 
 # Render plots in a browswer
 pio.renderers.default = 'browser'
 
+# dash serializes callback responses with plotly's json encoder, use orjson
+# (see requirements.txt). Fails on import if the package is missing rather
+# than silently falling back to the slower json engine
+pio.json.config.default_engine = 'orjson'
+
 
 # start the dash app
 app = dash.Dash(__name__,
@@ -168,7 +174,158 @@ card_scenario = dbc.Card(
 )
 
 
+# TAB LAYOUTS -----------------------------------------------------------------
+# built once, render_tab_content returns the same tree on every tab switch
+layout_mortgage = html.Div([
+    dbc.CardGroup([card_mtg_purchase, card_mtg_payments,
+                   card_mtg_equity, card_prepayments, card_scenario]),
+    dcc.Store(id='mtg-params'),
+    html.Br(),
+    dbc.Row(
+        [
+            dbc.Col(dcc.Loading([dcc.Graph(id='plot-amort', className='shadow-lg'),
+                                 dcc.Store(id='amort-figure')],
+                                color='#E95420', type='dot', fullscreen=False),
+                    xs=10, sm=10, md=10, lg=8, xl=8),
+            dbc.Col(dcc.Markdown(id='md-amort'),
+                    xs=10, sm=10, md=10, lg=4, xl=4, align='center')
+        ]
+    )
+])
+
+layout_rent_vs_buy = html.Div([
+    dbc.CardGroup([card_mtg_purchase, card_mtg_payments,
+                   card_mtg_equity, card_rent]),
+    html.Br(),
+    dbc.Row(
+        [
+            dbc.Col(dcc.Loading(dcc.Graph(id='plot-rent-vs-buy', className="shadow-lg"),
+                                color='#E95420', type='dot', fullscreen=False),
+                    xs=10, sm=10, md=10, lg=8, xl=8),
+            dbc.Col(dcc.Markdown(id='md-rent-vs-buy'),
+                    xs=10, sm=10, md=10, lg=4, xl=4)
+        ]
+    )
+])
+
+# the investment projections tab has no content yet
+tab_layouts = {'mortgage': layout_mortgage,
+               'rent_vs_buy': layout_rent_vs_buy}
+
+
+# MARKDOWN --------------------------------------------------------------------
+# summary text templates, formatted by the callbacks
+md_amort = """
+
+#### Mortgage Amortization  
+This calculator simulates mortgage amortization schedules based on the input parameters. 
+To compare scenarios, provide a scenario name and save the scenario. Adjust paramters
+to compare against the saved scenario.
+
+Prepayments can be added to view the impact of adding additional payments at specific dates.  
+
+**Total Interest:**${total_int:,.0f}  
+**Ending Equity:** ${end_equity:,.0f}  
+**Payback Period:** {payback}
+"""
+
+md_rent_vs_buy = """
+#### Rent Vs Buy
+This plot compares purchasing a home vs renting.  Owning a home requires additional 
+costs which are invested in the stock market for comparision.  
+
+**Invest in the Stock Market**  (Annual Return Assumption {inv_rate:.2f}%)
++ Downpayment:${deposit:,.0f}
++ Maintenence Fees ({frequency}):${main:,.0f}
++ Taxes ({frequency}):${taxes:,.0f}
++ Difference in Mortgage Payments vs Rent:${diff_payments:,.0f}
+
+**Mortgage Equity**  
+Equity is calculated as the difference in home value (annual appreciation 
+rate of {apr:.2f}%), less the outstanding mortgage and real estate fees of
+{re_fee:.2f}% upon selling.
+"""
+
+
+# CACHE -----------------------------------------------------------------------
+# Every button click or input change re-fires the callbacks below. The
+# schedules only depend on the numeric inputs, so memoize them on a hashable
+# copy of those inputs. Cached dataframes are shared, do not modify them.
+# Each entry is a full daily schedule (~1MB), keep the caches small so a
+# worker stays within the memory of a small host.
+def _prepay_key(prepay_store):
+    """
+    Convert the prepay-store (list of dicts) to a hashable tuple of (date, value)
+    """
+    return tuple((p['date'], p['value']) for p in prepay_store or ())
+
+
+@lru_cache(maxsize=16)
+def _amort_cached(start_date, price, deposit, payment, years, ir, apr, freq,
+                  fee, prepay_tuple):
+    """
+    Memoized loan_calc.get_amortization, prepayments are passed as a tuple
+    from _prepay_key. Returns the schedule, end date and the summary values
+    (total interest, ending equity, payback period) for the markdown
+    """
+    prepayments = [{'date': d, 'value': v} for d, v in prepay_tuple] or None
+    df, end_date, total_int, end_equity = loan_calc.get_amortization(
+        start_date, price, deposit, payment, years, ir, apr, freq, fee,
+        prepayments)
+
+    # summary values
+    years, months = divmod(
+        loan_calc.get_elapsed_months([end_date], start_date)[0], 12)
+    payback = f"{years} Years, {months} Months"
+    return df, end_date, total_int, end_equity, payback
+
+
+@lru_cache(maxsize=16)
+def _rent_vs_own_cached(start_date, price, deposit, payment, years, ir, apr,
+                        freq, re_fee, rent, inv_rate, fee, tax):
+    """
+    Memoized loan_calc.get_rent_vs_own, the schedule (without prepayments)
+    is shared with the mortgage tab through _amort_cached
+    """
+    df, end_date = _amort_cached(start_date, price, deposit, payment, years,
+                                 ir, apr, freq, re_fee, ())[:2]
+    return loan_calc.add_investment(df, end_date, deposit, payment, freq,
+                                    rent, inv_rate, fee, tax)
+
+
+# Dash serializes a returned Figure with the PlotlyJSONEncoder on every call.
+# Keep the serialized figure for each set of parameters and return the plain
+# dict instead, Dash accepts it wherever a Figure is expected.
+@lru_cache(maxsize=64)
+def _amort_fig_json(*params):
+    """
+    Serialized amortization plot (without scenarios) for the _amort_cached
+    parameters
+    """
+    df, end_date = _amort_cached(*params)[:2]
+    fig = loan_calc.plot_amortization(df, end_date, yrs=[5, 10, 15])
+    return json.loads(pio.to_json(fig))
+
+
+@lru_cache(maxsize=64)
+def _rent_vs_own_fig_json(*params):
+    """
+    Serialized rent vs own plot for the _rent_vs_own_cached parameters
+    """
+    df = _rent_vs_own_cached(*params)
+    return json.loads(pio.to_json(loan_calc.plot_rent_vs_own(df)))
+
+
 # CALLBACKS--------------------------------------------------------------------
+def _triggered_id():
+    """
+    Id of the component that triggered the current callback, None on the
+    initial call (dash.ctx.triggered_id in Dash >= 2.4)
+    """
+    triggered = dash.callback_context.triggered
+    return triggered[0]['prop_id'].split('.')[0] if triggered else None
+
+
 # tab content
 @app.callback(
     Output("tab-content", "children"),
@@ -181,55 +338,15 @@ def render_tab_content(active_tab):
     'active_tab' is.
     """
 
-    if active_tab == "mortgage":
-        return html.Div([
-            dbc.CardGroup([card_mtg_purchase, card_mtg_payments,
-                           card_mtg_equity, card_prepayments, card_scenario]),
-            html.Br(),
-            dbc.Row(
-                [
-                    dbc.Col(dcc.Loading(dcc.Graph(id='plot-amort', className='shadow-lg'),
-                                        color='#E95420', type='dot', fullscreen=False),
-                            xs=10, sm=10, md=10, lg=8, xl=8),
-                    dbc.Col(dcc.Markdown(id='md-amort'),
-                            xs=10, sm=10, md=10, lg=4, xl=4, align='center')
-                ]
-            )
-        ])
-    elif active_tab == "rent_vs_buy":
-        return html.Div([
-            dbc.CardGroup([card_mtg_purchase, card_mtg_payments, 
-                           card_mtg_equity, card_rent]),
-            html.Br(),
-            dbc.Row(
-                    [
-                        dbc.Col(dcc.Loading(dcc.Graph(id='plot-rent-vs-buy', className="shadow-lg"),
-                                            color = '#E95420', type='dot', fullscreen=False),
-                                xs=10, sm=10, md=10, lg=8, xl=8),
-                        dbc.Col(dcc.Markdown(id='md-rent-vs-buy'), 
-                                xs=10, sm=10, md=10, lg=4, xl=4)
-                    ]
-                )
-            ]),
-
-    # elif active_tab == 'invest':
-    #     return html.Div([
-
-        # ])
+    return tab_layouts.get(active_tab)
 
 
-@app.callback(
-    [
-     Output("plot-amort", 'figure'),
-     Output('md-amort', 'children'),
-     Output('prepay-store', 'data'),
-     Output('scenario-store', 'data')
-    ],
+# collect the mortgage inputs into one store so the schedule callback only
+# fires once per settled change (see assets/amort.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='amort', function_name='params'),
+    Output('mtg-params', 'data'),
     [
-     Input('add-prepay', 'n_clicks'),  # add prepay button click
-     Input('reset-prepay', 'n_clicks'),  # reset prepay button click
-     Input('add-scenario', 'n_clicks'),  # add scenario button click
-     Input('reset-scenario', 'n_clicks'),  # reset scenario button click
      Input('price', 'value'),
      Input('deposit', 'value'),
      Input('payment', 'value'),
@@ -238,91 +355,133 @@ def render_tab_content(active_tab):
      Input('re_fee', 'value'),
      Input('dd_freq', 'value'),
     ],
+    State('mtg-params', 'data')
+)
+
+
+# add/reset prepayments in the browser, the schedule callback fires when the
+# prepay-store changes (see assets/amort.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='amort', function_name='prepay'),
+    Output('prepay-store', 'data'),
+    [
+     Input('add-prepay', 'n_clicks'),
+     Input('reset-prepay', 'n_clicks'),
+    ],
     [
      State('prepay', 'value'),
      State('prepay-date', 'value'),
-     State('prepay-store', 'data'),  # prepay-store is also input
+     State('prepay-store', 'data'),
+    ]
+)
+
+
+# save/reset scenarios. The schedule for the current inputs is already cached
+# by plot_amortization
+@app.callback(
+    Output('scenario-store', 'data'),
+    [
+     Input('add-scenario', 'n_clicks'),  # add scenario button click
+     Input('reset-scenario', 'n_clicks'),  # reset scenario button click
+    ],
+    [
+     State('mtg-params', 'data'),
+     State('prepay-store', 'data'),
      State('scenario-name', 'value'),
-     State('scenario-store', 'data')  # scenario-store is also input
+     State('scenario-store', 'data')
     ]
 )
-def plot_amortization(n_prepay, n_prepay_reset, n_scenario, n_scenario_reset,
-                      price, deposit, payment, ir, apr, fee, freq, prepay_value,
-                      prepay_date, prepay_store, scenario_name, scenario_store):
+def save_scenario(n_scenario, n_scenario_reset, mtg_params, prepay_store,
+                  scenario_name, scenario_store):
 
-    # get a list of id's that changed
-    changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
+    # clear the scenario_store when first loaded
+    # or when the reset button is pushed
+    if n_scenario == 0 or _triggered_id() == 'reset-scenario':
+        return None
 
-    # get the current date
-    start_date = date.today()
+    # add the current schedule to the saved scenarios
+    inputs = mtg_params['params']
+    df = _amort_cached(date.today(), inputs['price'], inputs['deposit'],
+                       inputs['payment'], 25, inputs['ir'], inputs['apr'],
+                       inputs['freq'], inputs['fee'],
+                       _prepay_key(prepay_store))[0]
+    return loan_calc.save_scenario(df, scenario_name, scenario_store or None)
 
-    # get/add prepayments
-    if n_prepay >= 1:
-        if prepay_store is None:
-            # create the first store
-            prepay = [{'date': prepay_date, 'value': prepay_value}]
-            prepay_store = prepay.copy()
-        else:
-            # append additional prepayments to the store
-            prepay = {'date': prepay_date, 'value': prepay_value}
-            prepay_store.append(prepay)
-    else:
-        # no prepayments
-        prepay_store = None
 
-    # reset the prepayment store to none when the reset button is pushed
-    if 'reset-prepay' in changed_id:
-        prepay_store = None
+@app.callback(
+    [
+     Output('amort-figure', 'data'),
+     Output('md-amort', 'children')
+    ],
+    [
+     Input('mtg-params', 'data'),  # mortgage inputs
+     Input('prepay-store', 'data'),  # prepayments
+     Input('scenario-store', 'data'),  # saved scenarios
+    ]
+)
+def plot_amortization(mtg_params, prepay_store, scenario_store):
+
+    # get the id that changed
+    changed_id = _triggered_id()
 
-    # clear the scenario_store when first loaded
-    # or when the reset button is pushed
-    if n_scenario == 0 or 'reset-scenario' in changed_id:
-        scenario_store = None
-
-    # get the schedule
-    df, end_date = loan_calc.get_amortization(start_date, price, deposit,
-                                              payment, 25, ir, apr, freq,
-                                              fee, prepay_store, scenario_store)
-
-    # get/add scenarios
-    # if n_scenario:
-    if 'add-scenario' in changed_id:
-        if scenario_store is None:
-            # create the first scenario_store
-            scenario_store = loan_calc.save_scenario(df, scenario_name, None)
-        else:
-            # get new scenario, add to the scenario_store
-            scenario_store = loan_calc.save_scenario(df, scenario_name, scenario_store)
-
-    # update the markdown summary
-    total_int = df.interest.sum()
-    end_equity = df.equity.max()
-    diff = relativedelta(end_date, df.date.min())
-    payback = f"{diff.years} Years, {diff.months} Months"
+    # saving a scenario doesn't update the figure or md, the scenario is
+    # drawn with the next change
+    if changed_id == 'scenario-store' and scenario_store:
+        return dash.no_update, dash.no_update
+
+    # get the mortgage inputs
+    inputs = mtg_params['params']
+    price, deposit, payment = inputs['price'], inputs['deposit'], inputs['payment']
+    ir, apr, fee, freq = inputs['ir'], inputs['apr'], inputs['fee'], inputs['freq']
+
+    # get the current date
+    start_date = date.today()
 
+    # get the schedule (cached), then add the saved scenarios
+    params = (start_date, price, deposit, payment, 25, ir, apr, freq, fee,
+              _prepay_key(prepay_store))
+    df, end_date, total_int, end_equity, payback = _amort_cached(*params)
+    if scenario_store:
+        df = loan_calc.add_scenarios(df, scenario_store)
 
     # summary text for markdown
-    md = f"""
-    
-    #### Mortgage Amortization  
-    This calculator simulates mortgage amortization schedules based on the input parameters. 
-    To compare scenarios, provide a scenario name and save the scenario. Adjust paramters
-    to compare against the saved scenario.
-    
-    Prepayments can be added to view the impact of adding additional payments at specific dates.  
+    md = md_amort.format(total_int=total_int, end_equity=end_equity,
+                         payback=payback)
+
+    # the real estate fee only changes the equity hover data, which is
+    # re-priced in the browser (see assets/amort.js)
+    if changed_id == 'mtg-params' and mtg_params['changed'] == ['fee']:
+        return dash.no_update, md
+
+    # the appreciation rate only changes the equity hover data. Send the
+    # equity for the plotted dates, the figure is patched in the browser.
+    # Skipped with saved scenarios, they're drawn with the next full figure
+    if (changed_id == 'mtg-params' and mtg_params['changed'] == ['apr']
+            and not scenario_store):
+        plotted = loan_calc.get_month_ends(df.date, end_date)
+        equity = df.equity[plotted].round(2).tolist()
+        return {'equity': equity, 're_fee': fee}, md
+
+    # create/update the plot. Saved scenarios change the figure
+    # independently of the parameters, so only cache the plain schedule
+    if not scenario_store:
+        fig = _amort_fig_json(*params)
+    else:
+        fig = loan_calc.plot_amortization(df, end_date, yrs=[5, 10, 15])
 
-    **Total Interest:**${total_int:,.0f}  
-    **Ending Equity:** ${end_equity:,.0f}  
-    **Payback Period:** {payback}
-    """
-    # don't update the figure or md when saving scenarios
-    if 'add-scenario' in changed_id:
-        return dash.no_update, dash.no_update, prepay_store, scenario_store
+    return {'figure': fig, 're_fee': fee}, md
 
-    # create/update the plot
-    fig = loan_calc.plot_amortization(df, end_date, yrs=[5, 10, 15])
 
-    return fig, md, prepay_store, scenario_store
+# render the amortization figure, re-pricing equity for the current real
+# estate fee without a round trip to the server
+app.clientside_callback(
+    ClientsideFunction(namespace='amort', function_name='restyle'),
+    Output('plot-amort', 'figure'),
+    Input('amort-figure', 'data'),
+    Input('re_fee', 'value'),
+    State('plot-amort', 'figure')
+)
+
 
 @app.callback(
     [Output("plot-rent-vs-buy", "figure"), Output("md-rent-vs-buy", "children")],
@@ -342,15 +501,18 @@ def plot_amortization(n_prepay, n_prepay_reset, n_scenario, n_scenario_reset,
 def plot_rent_vs_buy(rent, fee, tax, inv_rate, price, deposit, payment,
                      ir, apr, re_fee, freq):
 
+    # skip empty/out of range inputs (None), and deposits covering the price
+    inputs = (rent, fee, tax, inv_rate, price, deposit, payment, ir, apr,
+              re_fee, freq)
+    if None in inputs or deposit >= price:
+        return dash.no_update, dash.no_update
+
     # get the current date
     start_date = date.today()
 
-    # get the amortization schedule
-    df = loan_calc.get_rent_vs_own(start_date, price, deposit, payment, 25,
-                                   ir, apr, freq, re_fee, rent, inv_rate,
-                                   fee, tax)
-    # create the plot
-    fig = loan_calc.plot_rent_vs_own(df)
+    # create the plot from the (cached) schedule
+    fig = _rent_vs_own_fig_json(start_date, price, deposit, payment, 25, ir,
+                                apr, freq, re_fee, rent, inv_rate, fee, tax)
 
     # calculate values for the summary markdown
     if freq == 'm':
@@ -364,22 +526,10 @@ def plot_rent_vs_buy(rent, fee, tax, inv_rate, price, deposit, payment,
         taxes = tax/24
         main = fee/2
 
-    md = f"""
-    #### Rent Vs Buy
-    This plot compares purchasing a home vs renting.  Owning a home requires additional 
-    costs which are invested in the stock market for comparision.  
-    
-    **Invest in the Stock Market**  (Annual Return Assumption {inv_rate:.2f}%)
-    + Downpayment:${deposit:,.0f}
-    + Maintenence Fees ({frequency}):${main:,.0f}
-    + Taxes ({frequency}):${taxes:,.0f}
-    + Difference in Mortgage Payments vs Rent:${diff_payments:,.0f}
-    
-    **Mortgage Equity**  
-    Equity is calculated as the difference in home value (annual appreciation 
-    rate of {apr:.2f}%), less the outstanding mortgage and real estate fees of
-    {re_fee:.2f}% upon selling.
-    """
+    md = md_rent_vs_buy.format(inv_rate=inv_rate, deposit=deposit,
+                               frequency=frequency, main=main, taxes=taxes,
+                               diff_payments=diff_payments, apr=apr,
+                               re_fee=re_fee)
     
     return fig, md
 